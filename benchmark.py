@@ -0,0 +1,494 @@
+#!/usr/bin/env python3
+"""Offline load test and benchmark harness for the deepfake detection API.
+
+Runs the FastAPI app in-process (no network, no uvicorn) against a mongomock
+stand-in or a local MongoDB, drives concurrent register/login/upload/list/
+delete/stats workloads with a synthetic media corpus and writes the results to JSON. Cold
+start (import of server.py and time-to-first-request in a fresh interpreter)
+is measured in subprocesses.
+
+    python benchmark.py --users 20 --uploads-per-user 5 --output bench.json
+    python benchmark.py --mongo-url mongodb://localhost:27017 --output bench.json
+    python benchmark.py --output new.json --compare old.json --max-regression 20
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import os
+import platform
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+import wave
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+BENCH_DB_NAME = "deepfake_bench"
+
+# server.py reads these at import time; point them at a local database so the
+# benchmark never touches the remote cluster configured in .env.
+os.environ["MONGO_URI"] = f"mongodb://localhost:27017/{BENCH_DB_NAME}"
+os.environ["MONGO_URL"] = "mongodb://localhost:27017"
+os.environ["DB_NAME"] = BENCH_DB_NAME
+sys.path.insert(0, str(ROOT_DIR))
+
+import httpx  # noqa: E402
+
+from maintenance import MaintenanceWorker  # noqa: E402
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples_ms):
+    """Latency summary in milliseconds"""
+    values = sorted(samples_ms)
+    summary = {
+        "min": round(values[0], 3) if values else 0.0,
+        "mean": round(sum(values) / len(values), 3) if values else 0.0,
+        "max": round(values[-1], 3) if values else 0.0,
+    }
+    for pct in PERCENTILES:
+        summary[f"p{pct}"] = round(percentile(values, pct), 3)
+    return summary
+
+
+class SyntheticCorpus:
+    """In-memory media files with realistic headers for every supported type"""
+
+    def __init__(self, seed=1234, image_size=(512, 512)):
+        self.rng = random.Random(seed)
+        self.image_size = image_size
+        self.files = []
+
+    def build(self, per_kind=4):
+        import cv2
+        import numpy as np
+
+        np_rng = np.random.default_rng(self.rng.randrange(2**32))
+        width, height = self.image_size
+        for i in range(per_kind):
+            noise = np_rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+            # Alternate sharp and blurred images so both detector branches run
+            if i % 2:
+                noise = cv2.GaussianBlur(noise, (15, 15), 0)
+            ok, jpg = cv2.imencode(".jpg", noise)
+            self.files.append((f"sample_{i}.jpg", jpg.tobytes(), "image/jpeg"))
+            ok, png = cv2.imencode(".png", noise)
+            self.files.append((f"sample_{i}.png", png.tobytes(), "image/png"))
+
+        for i in range(per_kind):
+            self.files.append((f"sample_{i}.wav", self._wav(seconds=1 + i % 3), "audio/wav"))
+            self.files.append((f"sample_{i}.mp3", self._mp3(64 * 1024), "audio/mpeg"))
+            self.files.append((f"sample_{i}.mp4", self._mp4(256 * 1024), "video/mp4"))
+        return self
+
+    def _wav(self, seconds, rate=16000):
+        buf = io.BytesIO()
+        with wave.open(buf, "wb") as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(2)
+            wav.setframerate(rate)
+            wav.writeframes(self.rng.randbytes(seconds * rate * 2))
+        return buf.getvalue()
+
+    def _mp3(self, size):
+        # ID3v2 header followed by MPEG-1 Layer III frame sync bytes
+        return b"ID3\x04\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" + self.rng.randbytes(size)
+
+    def _mp4(self, size):
+        ftyp = struct.pack(">I", 24) + b"ftypisom" + struct.pack(">I", 512) + b"isomiso2"
+        mdat = struct.pack(">I", size + 8) + b"mdat" + self.rng.randbytes(size)
+        return ftyp + mdat
+
+    def pick(self):
+        return self.rng.choice(self.files)
+
+
+class StageTimer:
+    """Wraps module-level functions of server.py to time individual stages"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def wrap(self, module, attr, stage_name):
+        original = getattr(module, attr)
+
+        def timed(*args, **kwargs):
+            name = stage_name(*args, **kwargs) if callable(stage_name) else stage_name
+            start = time.perf_counter()
+            try:
+                return original(*args, **kwargs)
+            finally:
+                self.samples[name].append((time.perf_counter() - start) * 1000)
+
+        setattr(module, attr, timed)
+
+    def report(self):
+        return {
+            name: {"count": len(values), "total_ms": round(sum(values), 3), "latency_ms": summarize(values)}
+            for name, values in sorted(self.samples.items())
+        }
+
+
+class APIBenchmark:
+    def __init__(self, server, args, corpus):
+        self.server = server
+        self.args = args
+        self.corpus = corpus
+        self.semaphore = asyncio.Semaphore(args.concurrency)
+        self.latencies = defaultdict(list)
+        self.status_counts = defaultdict(lambda: defaultdict(int))
+        self.errors = defaultdict(int)
+        self.phase_wall = {}
+        self.users = []
+
+    def client(self):
+        transport = httpx.ASGITransport(app=self.server.app)
+        return httpx.AsyncClient(transport=transport, base_url="https://testserver", timeout=None)
+
+    async def call(self, endpoint, client, method, url, expected=200, **kwargs):
+        async with self.semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except Exception:
+                self.errors[endpoint] += 1
+                return None
+            elapsed = (time.perf_counter() - start) * 1000
+        self.latencies[endpoint].append(elapsed)
+        self.status_counts[endpoint][str(response.status_code)] += 1
+        if response.status_code != expected:
+            self.errors[endpoint] += 1
+        return response
+
+    async def phase(self, name, coros):
+        start = time.perf_counter()
+        await asyncio.gather(*coros)
+        self.phase_wall[name] = time.perf_counter() - start
+
+    async def register_user(self, index):
+        client = self.client()
+        email = f"bench_{index}_{uuid.uuid4().hex[:8]}@example.com"
+        password = "BenchPass123!"
+        await self.call("POST /api/auth/register", client, "POST", "/api/auth/register",
+                        json={"email": email, "password": password, "name": f"Bench User {index}"})
+        self.users.append({"client": client, "email": email, "password": password, "uploads": []})
+
+    async def login_user(self, user):
+        await self.call("POST /api/auth/login", user["client"], "POST", "/api/auth/login",
+                        json={"email": user["email"], "password": user["password"]})
+
+    async def upload_files(self, user):
+        for _ in range(self.args.uploads_per_user):
+            name, content, content_type = self.corpus.pick()
+            response = await self.call("POST /api/upload", user["client"], "POST", "/api/upload",
+                                       files={"file": (name, content, content_type)})
+            if response is not None and response.status_code == 200:
+                user["uploads"].append(response.json()["upload_id"])
+
+    async def list_uploads(self, user):
+        for _ in range(self.args.lists_per_user):
+            await self.call("GET /api/uploads", user["client"], "GET", "/api/uploads")
+
+    async def delete_upload(self, user):
+        if user["uploads"]:
+            upload_id = user["uploads"].pop()
+            await self.call("DELETE /api/uploads/{id}", user["client"], "DELETE", f"/api/uploads/{upload_id}")
+
+    async def admin_stats(self, admin_client):
+        await self.call("GET /api/admin/stats", admin_client, "GET", "/api/admin/stats")
+
+    async def create_admin(self):
+        email = f"bench_admin_{uuid.uuid4().hex[:8]}@example.com"
+        password = "BenchAdmin123!"
+        await self.server.db.users.insert_one({
+            "user_id": f"user_{uuid.uuid4().hex[:12]}",
+            "email": email,
+            "name": "Bench Admin",
+            "password_hash": self.server.hash_password(password),
+            "role": "admin",
+            "created_at": datetime.now(timezone.utc).isoformat()
+        })
+        client = self.client()
+        await client.post("/api/auth/login", json={"email": email, "password": password})
+        return client
+
+    async def run(self):
+        args = self.args
+        admin_client = await self.create_admin()
+
+        await self.phase("register", [self.register_user(i) for i in range(args.users)])
+        await self.phase("login", [self.login_user(u) for u in self.users])
+        await self.phase("upload", [self.upload_files(u) for u in self.users])
+        await self.phase("list", [self.list_uploads(u) for u in self.users])
+        await self.phase("delete", [self.delete_upload(u) for u in self.users])
+        await self.phase("stats", [self.admin_stats(admin_client) for _ in range(args.stats_calls)])
+
+        for user in self.users:
+            await user["client"].aclose()
+        await admin_client.aclose()
+
+    def report(self):
+        phase_of = {
+            "POST /api/auth/register": "register",
+            "POST /api/auth/login": "login",
+            "POST /api/upload": "upload",
+            "GET /api/uploads": "list",
+            "DELETE /api/uploads/{id}": "delete",
+            "GET /api/admin/stats": "stats",
+        }
+        endpoints = {}
+        for endpoint, values in sorted(self.latencies.items()):
+            wall = self.phase_wall.get(phase_of.get(endpoint), 0)
+            endpoints[endpoint] = {
+                "count": len(values),
+                "errors": self.errors[endpoint],
+                "status_counts": dict(self.status_counts[endpoint]),
+                "throughput_rps": round(len(values) / wall, 3) if wall else 0.0,
+                "latency_ms": summarize(values),
+            }
+        return endpoints
+
+
+# Runs in a fresh interpreter; BENCH_SPAWNED_AT is the parent's clock just before spawning
+STARTUP_PROBE = """
+import asyncio, importlib, json, os, sys, time
+sys.path.insert(0, os.environ["BENCH_ROOT"])
+start = time.time()
+import httpx
+import server
+imported = time.time()
+spawned_at = float(os.environ["BENCH_SPAWNED_AT"])
+
+async def first_request():
+    # ASGITransport sends no lifespan events, so run startup/shutdown ourselves
+    async with server.app.router.lifespan_context(server.app):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="https://testserver") as client:
+            await client.get("/api/auth/me")
+        responded = time.time()
+        # What the first image analysis waits for before OpenCV is usable
+        await asyncio.to_thread(importlib.import_module, "cv2")
+        return responded, time.time()
+
+responded, analysis_ready = asyncio.run(first_request())
+print(json.dumps({
+    "import_server": (imported - start) * 1000,
+    "time_to_first_request": (responded - spawned_at) * 1000,
+    "time_to_first_analysis": (analysis_ready - spawned_at) * 1000,
+}))
+"""
+
+
+def measure_startup(runs):
+    samples = defaultdict(list)
+    env = dict(os.environ, BENCH_ROOT=str(ROOT_DIR))
+    for _ in range(runs):
+        env["BENCH_SPAWNED_AT"] = repr(time.time())
+        proc = subprocess.run([sys.executable, "-c", STARTUP_PROBE], env=env, cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True)
+        for name, value in json.loads(proc.stdout.strip().splitlines()[-1]).items():
+            samples[name].append(value)
+    return {
+        name: {"count": len(values), "latency_ms": summarize(values)}
+        for name, values in samples.items()
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+async def use_database(server, mongo_url):
+    if mongo_url:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        client = AsyncIOMotorClient(mongo_url)
+        await client.drop_database(BENCH_DB_NAME)
+        backend = "mongodb"
+    else:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("mongomock-motor is not installed; pip install mongomock-motor or pass --mongo-url")
+        client = AsyncMongoMockClient()
+        backend = "mongomock"
+    server.client = client
+    server.db = client[BENCH_DB_NAME]
+    return backend
+
+
+def use_rate_limiter(server, enabled):
+    from rate_limit import RateLimiter, build_quota_store
+    # Rebuild so quota counters live in the benchmark database; every virtual
+    # user shares one client IP, so per-IP limits reject most traffic when on
+    server.rate_limiter = RateLimiter(build_quota_store(server.db), enabled=enabled)
+
+
+async def run_benchmark(args):
+    import server
+
+    # Per-request access logs would dominate the measurement
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    upload_dir = Path(tempfile.mkdtemp(prefix="deepfake_bench_"))
+    server.UPLOAD_DIR = upload_dir
+    backend = await use_database(server, args.mongo_url)
+    use_rate_limiter(server, args.rate_limits)
+    server.maintenance = MaintenanceWorker(server.db, upload_dir)
+
+    stages = StageTimer()
+    stages.wrap(server, "hash_password", "hash_password")
+    stages.wrap(server, "verify_password", "verify_password")
+    stages.wrap(server, "analyze_deepfake",
+                lambda file_path, file_type: f"analyze_deepfake:{file_type.split('/')[0]}")
+
+    corpus = SyntheticCorpus(seed=args.seed, image_size=(args.image_width, args.image_height)).build()
+    bench = APIBenchmark(server, args, corpus)
+
+    await server.maintenance.start()
+    start = time.perf_counter()
+    await bench.run()
+    total = time.perf_counter() - start
+
+    maintenance_start = time.perf_counter()
+    await server.maintenance.run_once()
+    stages.samples["maintenance_run"].append((time.perf_counter() - maintenance_start) * 1000)
+    await server.maintenance.stop()
+
+    if args.mongo_url:
+        await server.client.drop_database(BENCH_DB_NAME)
+    for path in upload_dir.iterdir():
+        path.unlink()
+    upload_dir.rmdir()
+
+    return {
+        "meta": {
+            "git_revision": git_revision(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": backend,
+            "config": {
+                "users": args.users,
+                "uploads_per_user": args.uploads_per_user,
+                "lists_per_user": args.lists_per_user,
+                "stats_calls": args.stats_calls,
+                "concurrency": args.concurrency,
+                "image_size": [args.image_width, args.image_height],
+                "seed": args.seed,
+                "rate_limits": args.rate_limits,
+                "startup_runs": args.startup_runs,
+            },
+            "total_seconds": round(total, 3),
+        },
+        "phases_seconds": {name: round(wall, 3) for name, wall in bench.phase_wall.items()},
+        "endpoints": bench.report(),
+        "stages": stages.report(),
+        "startup": measure_startup(args.startup_runs),
+    }
+
+
+def print_results(results):
+    print(f"\n{'='*88}")
+    print(f"BENCHMARK ({results['meta']['database']}, rev {results['meta']['git_revision']})")
+    print(f"{'='*88}")
+    print(f"{'endpoint / stage':<34}{'count':>7}{'err':>5}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for name, data in results["endpoints"].items():
+        lat = data["latency_ms"]
+        print(f"{name:<34}{data['count']:>7}{data['errors']:>5}{data['throughput_rps']:>9.1f}"
+              f"{lat['p50']:>9.2f}{lat['p95']:>9.2f}{lat['p99']:>9.2f}{lat['max']:>9.2f}")
+    for name, data in results["stages"].items():
+        lat = data["latency_ms"]
+        print(f"{'  ' + name:<34}{data['count']:>7}{'':>5}{'':>9}"
+              f"{lat['p50']:>9.2f}{lat['p95']:>9.2f}{lat['p99']:>9.2f}{lat['max']:>9.2f}")
+    for name, data in results.get("startup", {}).items():
+        lat = data["latency_ms"]
+        print(f"{'startup: ' + name:<34}{data['count']:>7}{'':>5}{'':>9}"
+              f"{lat['p50']:>9.2f}{lat['p95']:>9.2f}{lat['p99']:>9.2f}{lat['max']:>9.2f}")
+    print(f"Total: {results['meta']['total_seconds']}s")
+
+
+def compare_results(baseline, current, max_regression=None):
+    """Print p50/p95 deltas against a previous run; return False on regression"""
+    print(f"\nCOMPARISON vs rev {baseline['meta'].get('git_revision')}")
+    ok = True
+    for section in ("endpoints", "stages", "startup"):
+        for name, data in current.get(section, {}).items():
+            old = baseline.get(section, {}).get(name)
+            if not old:
+                continue
+            deltas = []
+            for key in ("p50", "p95"):
+                before = old["latency_ms"][key]
+                after = data["latency_ms"][key]
+                change = (after - before) / before * 100 if before else 0.0
+                deltas.append(f"{key} {before:.2f} -> {after:.2f} ms ({change:+.1f}%)")
+                if max_regression is not None and key == "p95" and change > max_regression:
+                    ok = False
+            print(f"  {name:<32} " + ", ".join(deltas))
+    return ok
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test for the deepfake detection API")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--uploads-per-user", type=int, default=5)
+    parser.add_argument("--lists-per-user", type=int, default=5)
+    parser.add_argument("--stats-calls", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--image-width", type=int, default=512)
+    parser.add_argument("--image-height", type=int, default=512)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--mongo-url", help="Use a local MongoDB instead of mongomock")
+    parser.add_argument("--rate-limits", action="store_true",
+                        help="Keep upload/auth rate limiting enabled (disabled by default)")
+    parser.add_argument("--startup-runs", type=int, default=5,
+                        help="Fresh interpreters to spawn for the cold-start measurement")
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--compare", help="Previous results JSON to compare against")
+    parser.add_argument("--max-regression", type=float,
+                        help="Exit non-zero if any p95 regresses by more than this percentage")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = asyncio.run(run_benchmark(args))
+    print_results(results)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        if not compare_results(baseline, results, args.max_regression):
+            print("p95 regression above threshold")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import socket
+import time
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+
+def load_retention_policy() -> Dict[Optional[str], float]:
+    # RETENTION_DAYS applies to every result, RETENTION_DAYS_BY_RESULT='{"error": 1}'
+    # replaces it (shorter or longer) for the listed detection_result values.
+    # The None key is the catch-all.
+    policy: Dict[Optional[str], float] = {}
+    if os.environ.get("RETENTION_DAYS"):
+        policy[None] = float(os.environ["RETENTION_DAYS"])
+    for result, days in json.loads(os.environ.get("RETENTION_DAYS_BY_RESULT", "{}")).items():
+        policy[result] = float(days)
+    return policy
+
+
+def _unlink(path: str):
+    try:
+        Path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def _scan_upload_dir(upload_dir: Path) -> List[Tuple[str, str, float]]:
+    entries = []
+    with os.scandir(upload_dir) as it:
+        for entry in it:
+            if entry.is_file(follow_symlinks=False):
+                entries.append((entry.path, entry.name, entry.stat().st_mtime))
+    return entries
+
+
+class MaintenanceWorker:
+    """Background cleanup of orphaned files, expired uploads and sessions"""
+
+    def __init__(
+        self,
+        db,
+        upload_dir: Path,
+        interval_seconds: Optional[float] = None,
+        orphan_grace_seconds: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        retention: Optional[Dict[Optional[str], float]] = None,
+        enabled: Optional[bool] = None
+    ):
+        self.db = db
+        self.upload_dir = upload_dir
+        self.interval_seconds = interval_seconds or float(os.environ.get("MAINTENANCE_INTERVAL_SECONDS", 3600))
+        self.orphan_grace_seconds = (
+            orphan_grace_seconds if orphan_grace_seconds is not None
+            else float(os.environ.get("ORPHAN_GRACE_SECONDS", 3600))
+        )
+        self.batch_size = batch_size or int(os.environ.get("MAINTENANCE_BATCH_SIZE", 500))
+        self.retention = retention if retention is not None else load_retention_policy()
+        if enabled is None:
+            enabled = os.environ.get("MAINTENANCE_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._delete_queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def schedule_delete(self, file_path: str):
+        """Unlink a file off the request path; falls back to inline delete if not running"""
+        if self._delete_queue is None:
+            _unlink(file_path)
+            return
+        self._delete_queue.put_nowait(file_path)
+
+    async def start(self):
+        self._delete_queue = asyncio.Queue()
+        self._tasks.append(asyncio.create_task(self._delete_files()))
+        if self.enabled:
+            self._tasks.append(asyncio.create_task(self._run_periodically()))
+
+    async def stop(self):
+        if self._delete_queue is not None:
+            await self._delete_queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._delete_queue = None
+
+    async def _delete_files(self):
+        while True:
+            file_path = await self._delete_queue.get()
+            try:
+                await asyncio.to_thread(_unlink, file_path)
+            except Exception as e:
+                logger.error(f"Failed to delete {file_path}: {e}")
+            finally:
+                self._delete_queue.task_done()
+
+    def _next_delay(self) -> float:
+        # Up to 10% jitter so workers started together drift apart
+        return self.interval_seconds * random.uniform(1.0, 1.1)
+
+    async def _run_periodically(self):
+        # Wait a full interval first so booting or scaling workers don't all
+        # scan UPLOAD_DIR at once
+        while True:
+            await asyncio.sleep(self._next_delay())
+            try:
+                if await self.acquire_lease():
+                    await self.run_once()
+            except Exception as e:
+                logger.error(f"Maintenance run failed: {e}")
+
+    async def acquire_lease(self) -> bool:
+        """Claim this interval's run so only one worker across the deployment does it"""
+        now = datetime.now(timezone.utc)
+        # Shorter than the interval so the winner can take it again next time,
+        # longer than the jitter so the other workers find it held
+        expires_at = now + timedelta(seconds=self.interval_seconds / 2)
+        try:
+            await self.db.maintenance_leases.find_one_and_update(
+                {"_id": "maintenance", "expires_at": {"$lt": now}},
+                {"$set": {"owner": self.owner, "expires_at": expires_at}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The lease document exists and has not expired yet
+            return False
+        return True
+
+    async def run_once(self) -> Dict[str, int]:
+        stats = {
+            "expired_sessions": await self.purge_expired_sessions(),
+            "expired_uploads": await self.apply_retention(),
+        }
+        if self._delete_queue is not None:
+            # Let retention deletes land so the scan below doesn't report them as orphans
+            await self._delete_queue.join()
+        stats["orphaned_files"] = await self.reconcile_upload_dir()
+        logger.info(f"Maintenance run: {stats}")
+        return stats
+
+    async def purge_expired_sessions(self) -> int:
+        result = await self.db.user_sessions.delete_many(
+            {"expires_at": {"$lt": datetime.now(timezone.utc)}}
+        )
+        return result.deleted_count
+
+    async def apply_retention(self) -> int:
+        deleted = 0
+        now = datetime.now(timezone.utc)
+        overridden = [result for result in self.retention if result is not None]
+        for result, days in self.retention.items():
+            query = {
+                "created_at": {"$lt": (now - timedelta(days=days)).isoformat()},
+                # Flagged uploads are kept for admin review regardless of age
+                "flagged": {"$ne": True},
+            }
+            if result is not None:
+                query["detection_result"] = result
+            elif overridden:
+                query["detection_result"] = {"$nin": overridden}
+            while True:
+                batch = await self.db.uploads.find(
+                    query, {"_id": 0, "upload_id": 1, "file_path": 1}
+                ).limit(self.batch_size).to_list(self.batch_size)
+                if not batch:
+                    break
+                ids = [doc["upload_id"] for doc in batch]
+                # Re-check the flag: an admin may have flagged one since the find,
+                # in which case both the record and its file must survive
+                await self.db.uploads.delete_many({"upload_id": {"$in": ids}, "flagged": {"$ne": True}})
+                still_there = await self.db.uploads.find(
+                    {"upload_id": {"$in": ids}}, {"_id": 0, "upload_id": 1}
+                ).to_list(len(ids))
+                kept = {doc["upload_id"] for doc in still_there}
+                for doc in batch:
+                    if doc["upload_id"] not in kept:
+                        self.schedule_delete(doc["file_path"])
+                        deleted += 1
+        return deleted
+
+    async def reconcile_upload_dir(self) -> int:
+        if not self.upload_dir.exists():
+            return 0
+        entries = await asyncio.to_thread(_scan_upload_dir, self.upload_dir)
+        # Files younger than the grace period may belong to an upload still being analyzed
+        cutoff = time.time() - self.orphan_grace_seconds
+        candidates = [(path, name) for path, name, mtime in entries if mtime < cutoff]
+
+        deleted = 0
+        for start in range(0, len(candidates), self.batch_size):
+            batch = candidates[start:start + self.batch_size]
+            # Stored files are named "<upload_id>.<ext>"
+            by_upload_id = {name.split(".")[0]: path for path, name in batch}
+            known = await self.db.uploads.find(
+                {"upload_id": {"$in": list(by_upload_id)}}, {"_id": 0, "upload_id": 1}
+            ).to_list(len(by_upload_id))
+            for doc in known:
+                by_upload_id.pop(doc["upload_id"], None)
+            for path in by_upload_id.values():
+                self.schedule_delete(path)
+            deleted += len(by_upload_id)
+        return deleted
@@ -0,0 +1,42 @@
+from typing import Optional
+
+# Enough for every signature below; MP3/ISO-BMFF headers sit in the first bytes
+SNIFF_BYTES = 4096
+
+# Declared content type -> container formats whose magic bytes are acceptable
+CONTENT_TYPE_FORMATS = {
+    "image/jpeg": {"jpeg"},
+    "image/jpg": {"jpeg"},
+    "image/png": {"png"},
+    "audio/mpeg": {"mp3"},
+    "audio/mp3": {"mp3"},
+    "audio/wav": {"wav"},
+    "video/mp4": {"isobmff"},
+    "video/avi": {"avi"},
+    "video/quicktime": {"isobmff", "quicktime"},
+}
+
+# Top-level atoms that open pre-ftyp QuickTime files
+QUICKTIME_ATOMS = {b"moov", b"mdat", b"wide", b"free", b"skip", b"pnot"}
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "avi"
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    if head[4:8] == b"ftyp":
+        return "isobmff"
+    if head[4:8] in QUICKTIME_ATOMS:
+        return "quicktime"
+    return None
+
+
+def matches_content_type(content_type: str, head: bytes) -> bool:
+    return sniff_format(head) in CONTENT_TYPE_FORMATS.get(content_type, set())
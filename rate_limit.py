@@ -0,0 +1,253 @@
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone, timedelta
+from typing import Dict, Optional, Set, Tuple
+
+from fastapi import HTTPException, Request
+from pydantic import BaseModel
+from pymongo import ReturnDocument
+
+
+class BucketLimit(BaseModel):
+    capacity: float
+    refill_per_second: float
+
+
+class RoleLimits(BaseModel):
+    upload: BucketLimit
+    daily_upload_bytes: int
+    daily_upload_count: int
+
+
+class IPLimits(BaseModel):
+    auth: BucketLimit
+    upload: BucketLimit
+
+
+DEFAULT_ROLE_LIMITS = {
+    "user": RoleLimits(
+        upload=BucketLimit(capacity=10, refill_per_second=10 / 60),
+        daily_upload_bytes=500 * 1024 * 1024,
+        daily_upload_count=200,
+    ),
+    "admin": RoleLimits(
+        upload=BucketLimit(capacity=60, refill_per_second=1),
+        daily_upload_bytes=5 * 1024 * 1024 * 1024,
+        daily_upload_count=2000,
+    ),
+}
+
+# Per-IP buckets are keyed by the real client address. Behind the ingress the
+# TCP peer is the proxy, so list its address in TRUSTED_PROXIES (comma
+# separated) to key on X-Forwarded-For instead; otherwise every client shares
+# the proxy's bucket. Running uvicorn with --proxy-headers
+# --forwarded-allow-ips=<proxy ip> achieves the same at the server level.
+DEFAULT_IP_LIMITS = IPLimits(
+    auth=BucketLimit(capacity=10, refill_per_second=10 / 60),
+    upload=BucketLimit(capacity=30, refill_per_second=30 / 60),
+)
+
+
+def _merge(base: dict, override: dict) -> dict:
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def load_role_limits() -> Dict[str, RoleLimits]:
+    # RATE_LIMITS='{"user": {"daily_upload_count": 50, "upload": {"capacity": 5}}}'
+    limits = dict(DEFAULT_ROLE_LIMITS)
+    overrides = json.loads(os.environ.get("RATE_LIMITS", "{}"))
+    for role, values in overrides.items():
+        base = limits.get(role, DEFAULT_ROLE_LIMITS["user"]).model_dump()
+        limits[role] = RoleLimits(**_merge(base, values))
+    return limits
+
+
+def load_ip_limits() -> IPLimits:
+    overrides = json.loads(os.environ.get("IP_RATE_LIMITS", "{}"))
+    return IPLimits(**_merge(DEFAULT_IP_LIMITS.model_dump(), overrides))
+
+
+def load_trusted_proxies() -> Set[str]:
+    return {ip.strip() for ip in os.environ.get("TRUSTED_PROXIES", "").split(",") if ip.strip()}
+
+
+def client_ip(request: Request, trusted_proxies: Set[str]) -> str:
+    peer = request.client.host if request.client else "unknown"
+    if peer not in trusted_proxies:
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+    # Walk back from the nearest hop; the first untrusted address is the client
+    for hop in reversed(hops):
+        if hop not in trusted_proxies:
+            return hop
+    return peer
+
+
+def seconds_until_utc_midnight(now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, math.ceil((tomorrow - now).total_seconds()))
+
+
+def quota_expiry(day: str) -> datetime:
+    # Keep a day's counters until the end of the following day
+    start = datetime.fromisoformat(day).replace(tzinfo=timezone.utc)
+    return start + timedelta(days=2)
+
+
+def too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+
+class TokenBucketLimiter:
+    """In-process token buckets keyed by an arbitrary string, bounded as an LRU"""
+
+    def __init__(self, max_keys: int = 100_000):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def acquire(self, key: str, limit: BucketLimit, cost: float = 1.0) -> float:
+        """Take `cost` tokens; returns 0 if allowed, else seconds until they are available"""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.refill_per_second)
+
+        if tokens >= cost:
+            self._store(key, tokens - cost, now)
+            return 0.0
+
+        self._store(key, tokens, now)
+        if limit.refill_per_second <= 0:
+            return 24 * 60 * 60
+        return (cost - tokens) / limit.refill_per_second
+
+    def _store(self, key: str, tokens: float, now: float):
+        self._buckets[key] = (tokens, now)
+        self._buckets.move_to_end(key)
+        # Evicting the least recently used key is O(1); that bucket simply
+        # starts full again if its client comes back
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class MemoryQuotaStore:
+    """Single-process stand-in for MongoQuotaStore"""
+
+    def __init__(self):
+        self._day: Optional[str] = None
+        self._usage: Dict[str, Tuple[int, int]] = {}
+
+    async def add(self, user_id: str, day: str, nbytes: int, count: int) -> Tuple[int, int]:
+        if day != self._day:
+            # Only today's counters are ever read again
+            self._day = day
+            self._usage.clear()
+        used_bytes, used_count = self._usage.get(user_id, (0, 0))
+        used = (used_bytes + nbytes, used_count + count)
+        self._usage[user_id] = used
+        return used
+
+    async def ensure_indexes(self):
+        pass
+
+
+class MongoQuotaStore:
+    """Daily usage counters shared across workers through atomic $inc"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def add(self, user_id: str, day: str, nbytes: int, count: int) -> Tuple[int, int]:
+        doc = await self.collection.find_one_and_update(
+            {"_id": f"{user_id}:{day}"},
+            {
+                "$inc": {"bytes": nbytes, "count": count},
+                "$setOnInsert": {"user_id": user_id, "day": day, "expires_at": quota_expiry(day)}
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc["bytes"], doc["count"]
+
+    async def ensure_indexes(self):
+        # Counters are only read on their own day; let Mongo drop them afterwards
+        await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+
+def build_quota_store(db):
+    if os.environ.get("RATE_LIMIT_BACKEND", "mongo") == "memory":
+        return MemoryQuotaStore()
+    return MongoQuotaStore(db.upload_quotas)
+
+
+class RateLimiter:
+    def __init__(self, quota_store, role_limits=None, ip_limits=None, enabled=None, trusted_proxies=None):
+        self.quota_store = quota_store
+        self.role_limits = role_limits or load_role_limits()
+        self.ip_limits = ip_limits or load_ip_limits()
+        self.trusted_proxies = trusted_proxies if trusted_proxies is not None else load_trusted_proxies()
+        if enabled is None:
+            enabled = os.environ.get("RATE_LIMITS_ENABLED", "true").lower() not in ("0", "false", "no")
+        self.enabled = enabled
+        self.buckets = TokenBucketLimiter()
+        # user_id -> day on which the quota ran out; keeps rejected users off the database
+        self._exhausted: Dict[str, str] = {}
+
+    def limits_for(self, role: str) -> RoleLimits:
+        return self.role_limits.get(role, self.role_limits["user"])
+
+    def check_ip(self, request: Request, route: str):
+        if not self.enabled:
+            return
+        ip = client_ip(request, self.trusted_proxies)
+        retry_after = self.buckets.acquire(f"ip:{route}:{ip}", getattr(self.ip_limits, route))
+        if retry_after:
+            raise too_many_requests("Too many requests", retry_after)
+
+    def check_user(self, user, route: str):
+        if not self.enabled:
+            return
+        limit = getattr(self.limits_for(user.role), route)
+        retry_after = self.buckets.acquire(f"user:{route}:{user.user_id}", limit)
+        if retry_after:
+            raise too_many_requests("Too many requests", retry_after)
+
+    async def consume_upload_quota(self, user, file_size: int) -> Optional[str]:
+        """Charge one upload against today's quota; returns the day charged, for refunds"""
+        if not self.enabled:
+            return None
+        day = datetime.now(timezone.utc).date().isoformat()
+        if self._exhausted.get(user.user_id) == day:
+            raise too_many_requests("Daily upload quota exceeded", seconds_until_utc_midnight())
+
+        limits = self.limits_for(user.role)
+        used_bytes, used_count = await self.quota_store.add(user.user_id, day, file_size, 1)
+        if used_bytes > limits.daily_upload_bytes or used_count > limits.daily_upload_count:
+            # Give back what this request reserved so a smaller file can still fit
+            await self.quota_store.add(user.user_id, day, -file_size, -1)
+            if used_count > limits.daily_upload_count:
+                if any(d != day for d in self._exhausted.values()):
+                    self._exhausted = {k: d for k, d in self._exhausted.items() if d == day}
+                self._exhausted[user.user_id] = day
+            raise too_many_requests("Daily upload quota exceeded", seconds_until_utc_midnight())
+        return day
+
+    async def refund_upload_quota(self, user, day: Optional[str], file_size: int):
+        if day is None:
+            return
+        await self.quota_store.add(user.user_id, day, -file_size, -1)
+        # A concurrent upload may have been rejected while this one held the slot
+        self._exhausted.pop(user.user_id, None)
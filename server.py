@@ -1,25 +1,3 @@
-# ---- MongoDB connection (paste at top of server.py) ----
-import os
-from dotenv import load_dotenv
-from pymongo import MongoClient
-
-# load .env (we created backend/.env before)
-load_dotenv()
-
-MONGO_URI = os.getenv("MONGO_URI")
-if not MONGO_URI:
-    raise RuntimeError("MONGO_URI not found in .env — open backend/.env and set it")
-
-# create client and select DB from the URI (deepfake_db)
-mongo_client = MongoClient(MONGO_URI)
-db = mongo_client.get_database()  # db.name should be 'deepfake_db'
-# --------------------------------------------------------
-# Test if MongoDB connected
-try:
-    print("MongoDB connected to database:", db.name)
-except Exception as e:
-    print("MongoDB connection error:", e)
-
 from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Request, Response, Cookie
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
@@ -32,19 +10,19 @@ from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
 from datetime import datetime, timezone, timedelta
-import bcrypt
-import httpx
+import asyncio
+import importlib
 import shutil
 import random
-import cv2
-import numpy as np
-from PIL import Image
-import io
+from rate_limit import RateLimiter, build_quota_store
+from maintenance import MaintenanceWorker
+from media_sniff import SNIFF_BYTES, matches_content_type
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-mongo_url = os.environ['MONGO_URL']
+# Motor connects lazily, so nothing here blocks worker startup
+mongo_url = os.environ.get('MONGO_URL') or os.environ['MONGO_URI']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
@@ -54,6 +32,9 @@ api_router = APIRouter(prefix="/api")
 UPLOAD_DIR = ROOT_DIR / "uploads"
 UPLOAD_DIR.mkdir(exist_ok=True)
 
+rate_limiter = RateLimiter(build_quota_store(db))
+maintenance = MaintenanceWorker(db, UPLOAD_DIR)
+
 class User(BaseModel):
     model_config = ConfigDict(extra="ignore")
     user_id: str
@@ -86,9 +67,11 @@ class Upload(BaseModel):
     flagged: bool = False
 
 def hash_password(password: str) -> str:
+    import bcrypt
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
 
 def verify_password(password: str, hashed: str) -> bool:
+    import bcrypt
     return bcrypt.checkpw(password.encode(), hashed.encode())
 
 async def get_current_user(request: Request) -> Optional[User]:
@@ -132,9 +115,31 @@ async def require_admin(request: Request) -> User:
         raise HTTPException(status_code=403, detail="Admin access required")
     return user
 
+_cv2_import: Optional[asyncio.Task] = None
+
+async def load_analysis_imports(file_type: str):
+    # OpenCV is only needed for images and is slow to import; the first image
+    # upload loads it in a thread so the event loop keeps serving meanwhile.
+    # Every image request awaits the same task: sys.modules gets a partially
+    # initialised cv2 as soon as the import starts, so checking it would let
+    # a second request block the loop on the import lock.
+    global _cv2_import
+    if not file_type.startswith("image"):
+        return
+    if _cv2_import is None:
+        _cv2_import = asyncio.create_task(asyncio.to_thread(importlib.import_module, "cv2"))
+    try:
+        # Shielded so a disconnecting client doesn't cancel it for the others
+        await asyncio.shield(_cv2_import)
+    except ImportError as e:
+        # Let a later upload retry; analyze_deepfake reports this one as an error
+        _cv2_import = None
+        logger.error(f"Could not load OpenCV: {e}")
+
 def analyze_deepfake(file_path: str, file_type: str) -> tuple[str, float]:
     try:
         if file_type.startswith("image"):
+            import cv2
             img = cv2.imread(file_path)
             if img is None:
                 return "error", 0.0
@@ -169,7 +174,8 @@ def analyze_deepfake(file_path: str, file_type: str) -> tuple[str, float]:
         return "error", 0.0
 
 @api_router.post("/auth/register")
-async def register(input: RegisterInput):
+async def register(request: Request, input: RegisterInput):
+    rate_limiter.check_ip(request, "auth")
     existing = await db.users.find_one({"email": input.email}, {"_id": 0})
     if existing:
         raise HTTPException(status_code=400, detail="Email already registered")
@@ -207,7 +213,8 @@ async def register(input: RegisterInput):
     return response
 
 @api_router.post("/auth/login")
-async def login(input: LoginInput):
+async def login(request: Request, input: LoginInput):
+    rate_limiter.check_ip(request, "auth")
     user_doc = await db.users.find_one({"email": input.email}, {"_id": 0})
     if not user_doc or not verify_password(input.password, user_doc["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
@@ -234,10 +241,13 @@ async def login(input: LoginInput):
     return response
 
 @api_router.get("/auth/session")
-async def process_google_session(session_id: str = None, response: Response = None):
+async def process_google_session(request: Request, session_id: str = None, response: Response = None):
+    rate_limiter.check_ip(request, "auth")
     if not session_id:
         raise HTTPException(status_code=400, detail="session_id required")
     
+    import httpx
+    
     async with httpx.AsyncClient() as client:
         resp = await client.get(
             "https://demobackend.emergentagent.com/auth/v1/env/oauth/session-data",
@@ -307,7 +317,9 @@ async def logout(request: Request, response: Response):
 
 @api_router.post("/upload", response_model=Upload)
 async def upload_file(request: Request, file: UploadFile = File(...)):
+    rate_limiter.check_ip(request, "upload")
     user = await require_auth(request)
+    rate_limiter.check_user(user, "upload")
     
     if file.size > 100 * 1024 * 1024:
         raise HTTPException(status_code=400, detail="File too large (max 100MB)")
@@ -321,14 +333,27 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
     if file.content_type not in allowed_types:
         raise HTTPException(status_code=400, detail="File type not supported")
     
+    head = await file.read(SNIFF_BYTES)
+    await file.seek(0)
+    if not matches_content_type(file.content_type, head):
+        raise HTTPException(status_code=400, detail="File content does not match its type")
+    
+    quota_day = await rate_limiter.consume_upload_quota(user, file.size)
+    
     upload_id = f"upload_{uuid.uuid4().hex[:12]}"
     file_ext = file.filename.split(".")[-1]
     file_name = f"{upload_id}.{file_ext}"
     file_path = UPLOAD_DIR / file_name
     
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    
+    try:
+        with open(file_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+    except Exception:
+        maintenance.schedule_delete(str(file_path))
+        await rate_limiter.refund_upload_quota(user, quota_day, file.size)
+        raise
+    
+    await load_analysis_imports(file.content_type)
     result, confidence = analyze_deepfake(str(file_path), file.content_type)
     
     upload_doc = {
@@ -343,7 +368,12 @@ async def upload_file(request: Request, file: UploadFile = File(...)):
         "created_at": datetime.now(timezone.utc).isoformat(),
         "flagged": False
     }
-    await db.uploads.insert_one(upload_doc)
+    try:
+        await db.uploads.insert_one(upload_doc)
+    except Exception:
+        maintenance.schedule_delete(str(file_path))
+        await rate_limiter.refund_upload_quota(user, quota_day, file.size)
+        raise
     
     return Upload(**upload_doc)
 
@@ -368,11 +398,8 @@ async def delete_upload(request: Request, upload_id: str):
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     
-    file_path = Path(upload["file_path"])
-    if file_path.exists():
-        file_path.unlink()
-    
     await db.uploads.delete_one({"upload_id": upload_id})
+    maintenance.schedule_delete(upload["file_path"])
     return {"message": "Upload deleted"}
 
 @api_router.get("/admin/uploads", response_model=List[Upload])
@@ -412,11 +439,8 @@ async def admin_delete_upload(request: Request, upload_id: str):
     if not upload:
         raise HTTPException(status_code=404, detail="Upload not found")
     
-    file_path = Path(upload["file_path"])
-    if file_path.exists():
-        file_path.unlink()
-    
     await db.uploads.delete_one({"upload_id": upload_id})
+    maintenance.schedule_delete(upload["file_path"])
     return {"message": "Upload deleted"}
 
 @api_router.get("/admin/stats")
@@ -455,6 +479,22 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+async def ensure_quota_indexes():
+    try:
+        await rate_limiter.quota_store.ensure_indexes()
+    except Exception as e:
+        logger.warning(f"Could not create upload quota indexes: {e}")
+
+@app.on_event("startup")
+async def start_quota_indexes():
+    # Runs in the background so workers start serving without waiting on Mongo
+    app.state.quota_indexes = asyncio.create_task(ensure_quota_indexes())
+
+@app.on_event("startup")
+async def start_maintenance():
+    await maintenance.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await maintenance.stop()
     client.close()
\ No newline at end of file
@@ -0,0 +1,233 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from maintenance import MaintenanceWorker
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+
+def make_db():
+    return mongomock_motor.AsyncMongoMockClient()["test"]
+
+
+def make_file(upload_dir, name, age_seconds=0):
+    path = upload_dir / name
+    path.write_bytes(b"x")
+    mtime = time.time() - age_seconds
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def upload_doc(upload_id, path, age_days, result="real", flagged=False):
+    created_at = datetime.now(timezone.utc) - timedelta(days=age_days)
+    return {
+        "upload_id": upload_id,
+        "file_path": str(path),
+        "created_at": created_at.isoformat(),
+        "detection_result": result,
+        "flagged": flagged,
+    }
+
+
+async def remaining_ids(db):
+    docs = await db.uploads.find({}, {"_id": 0, "upload_id": 1}).to_list(None)
+    return {doc["upload_id"] for doc in docs}
+
+
+def test_catch_all_retention_skips_results_with_their_own_policy(tmp_path):
+    db = make_db()
+    old_fake = make_file(tmp_path, "upload_fake.jpg")
+    old_real = make_file(tmp_path, "upload_real.jpg")
+    ancient_fake = make_file(tmp_path, "upload_ancient.jpg")
+    worker = MaintenanceWorker(db, tmp_path, retention={None: 30, "fake": 365})
+
+    async def scenario():
+        await db.uploads.insert_many([
+            upload_doc("upload_fake", old_fake, 40, result="fake"),
+            upload_doc("upload_real", old_real, 40, result="real"),
+            upload_doc("upload_ancient", ancient_fake, 400, result="fake"),
+        ])
+        deleted = await worker.apply_retention()
+        return deleted, await remaining_ids(db)
+
+    deleted, remaining = asyncio.run(scenario())
+    assert deleted == 2
+    assert remaining == {"upload_fake"}
+    assert old_fake.exists()
+    assert not old_real.exists()
+    assert not ancient_fake.exists()
+
+
+def test_shorter_per_result_policy_applies(tmp_path):
+    db = make_db()
+    error_file = make_file(tmp_path, "upload_error.jpg")
+    real_file = make_file(tmp_path, "upload_real.jpg")
+    worker = MaintenanceWorker(db, tmp_path, retention={None: 30, "error": 1})
+
+    async def scenario():
+        await db.uploads.insert_many([
+            upload_doc("upload_error", error_file, 2, result="error"),
+            upload_doc("upload_real", real_file, 2, result="real"),
+        ])
+        await worker.apply_retention()
+        return await remaining_ids(db)
+
+    assert asyncio.run(scenario()) == {"upload_real"}
+    assert not error_file.exists()
+    assert real_file.exists()
+
+
+def test_retention_keeps_flagged_uploads(tmp_path):
+    db = make_db()
+    flagged = make_file(tmp_path, "upload_flagged.jpg")
+    worker = MaintenanceWorker(db, tmp_path, retention={None: 1})
+
+    async def scenario():
+        await db.uploads.insert_one(upload_doc("upload_flagged", flagged, 10, flagged=True))
+        deleted = await worker.apply_retention()
+        return deleted, await remaining_ids(db)
+
+    assert asyncio.run(scenario()) == (0, {"upload_flagged"})
+    assert flagged.exists()
+
+
+class FlagAfterFind:
+    """Flags an upload right after the retention query reads it"""
+
+    def __init__(self, uploads, upload_id):
+        self.uploads = uploads
+        self.upload_id = upload_id
+        self.flagged = False
+
+    def __getattr__(self, name):
+        return getattr(self.uploads, name)
+
+    def find(self, *args, **kwargs):
+        cursor = self.uploads.find(*args, **kwargs)
+        outer = self
+
+        class Cursor:
+            def limit(self, n):
+                cursor.limit(n)
+                return self
+
+            async def to_list(self, length):
+                docs = await cursor.to_list(length)
+                if not outer.flagged:
+                    outer.flagged = True
+                    await outer.uploads.update_one({"upload_id": outer.upload_id}, {"$set": {"flagged": True}})
+                return docs
+
+        return Cursor()
+
+
+def test_retention_spares_upload_flagged_between_find_and_delete(tmp_path):
+    db = make_db()
+    racing = make_file(tmp_path, "upload_racing.jpg")
+    other = make_file(tmp_path, "upload_other.jpg")
+    worker = MaintenanceWorker(SimpleNamespace(uploads=FlagAfterFind(db.uploads, "upload_racing")),
+                               tmp_path, retention={None: 1})
+
+    async def scenario():
+        await db.uploads.insert_many([
+            upload_doc("upload_racing", racing, 10),
+            upload_doc("upload_other", other, 10),
+        ])
+        deleted = await worker.apply_retention()
+        return deleted, await remaining_ids(db)
+
+    assert asyncio.run(scenario()) == (1, {"upload_racing"})
+    assert racing.exists()
+    assert not other.exists()
+
+
+def test_reconcile_deletes_only_old_orphans(tmp_path):
+    db = make_db()
+    known = make_file(tmp_path, "upload_known.jpg", age_seconds=7200)
+    orphan = make_file(tmp_path, "upload_orphan.png", age_seconds=7200)
+    fresh_orphan = make_file(tmp_path, "upload_fresh.jpg", age_seconds=10)
+    worker = MaintenanceWorker(db, tmp_path, orphan_grace_seconds=3600, batch_size=1, retention={})
+
+    async def scenario():
+        await db.uploads.insert_one(upload_doc("upload_known", known, 0))
+        return await worker.reconcile_upload_dir()
+
+    assert asyncio.run(scenario()) == 1
+    assert known.exists()
+    assert not orphan.exists()
+    assert fresh_orphan.exists()
+
+
+def test_purge_expired_sessions():
+    db = make_db()
+    worker = MaintenanceWorker(db, None, retention={})
+    now = datetime.now(timezone.utc)
+
+    async def scenario():
+        await db.user_sessions.insert_many([
+            {"session_token": "expired", "expires_at": now - timedelta(minutes=1)},
+            {"session_token": "live", "expires_at": now + timedelta(days=1)},
+        ])
+        deleted = await worker.purge_expired_sessions()
+        docs = await db.user_sessions.find({}, {"_id": 0}).to_list(None)
+        return deleted, [doc["session_token"] for doc in docs]
+
+    assert asyncio.run(scenario()) == (1, ["live"])
+
+
+def test_scheduled_deletes_drain_on_stop(tmp_path):
+    path = make_file(tmp_path, "upload_gone.jpg")
+    worker = MaintenanceWorker(make_db(), tmp_path, retention={}, enabled=False)
+
+    async def scenario():
+        await worker.start()
+        worker.schedule_delete(str(path))
+        await worker.stop()
+
+    asyncio.run(scenario())
+    assert not path.exists()
+
+
+def test_only_one_worker_gets_the_lease_per_interval():
+    db = make_db()
+    first = MaintenanceWorker(db, None, interval_seconds=3600, retention={})
+    second = MaintenanceWorker(db, None, interval_seconds=3600, retention={})
+
+    async def scenario():
+        won = [await first.acquire_lease(), await second.acquire_lease()]
+        # Once the lease lapses the next caller takes it over
+        await db.maintenance_leases.update_one(
+            {"_id": "maintenance"}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+        )
+        won.append(await second.acquire_lease())
+        return won
+
+    assert asyncio.run(scenario()) == [True, False, True]
+
+
+def test_first_run_waits_for_an_interval(tmp_path):
+    worker = MaintenanceWorker(make_db(), tmp_path, interval_seconds=0.2, retention={})
+    runs = []
+
+    async def run_once():
+        runs.append(time.monotonic())
+
+    worker.run_once = run_once
+
+    async def scenario():
+        started = time.monotonic()
+        await worker.start()
+        await asyncio.sleep(0.1)
+        assert runs == []
+        await asyncio.sleep(0.25)
+        await worker.stop()
+        return started
+
+    started = asyncio.run(scenario())
+    assert len(runs) == 1
+    assert runs[0] - started >= 0.2
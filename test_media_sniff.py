@@ -0,0 +1,101 @@
+import asyncio
+import os
+import struct
+import sys
+from pathlib import Path
+
+import pytest
+
+from media_sniff import matches_content_type, sniff_format
+
+JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + b"\x00" * 32
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00\x00\x00\rIHDR" + b"\x00" * 32
+WAV = b"RIFF" + struct.pack("<I", 36) + b"WAVEfmt " + b"\x00" * 32
+AVI = b"RIFF" + struct.pack("<I", 36) + b"AVI LIST" + b"\x00" * 32
+MP3_ID3 = b"ID3\x04\x00\x00\x00\x00\x00\x00" + b"\xff\xfb\x90\x00" + b"\x00" * 32
+MP3_FRAME_SYNC = b"\xff\xfb\x90\x00" + b"\x00" * 32
+MP4 = struct.pack(">I", 24) + b"ftypisom" + struct.pack(">I", 512) + b"isomiso2"
+MOV_FTYP = struct.pack(">I", 20) + b"ftypqt  " + struct.pack(">I", 0) + b"qt  "
+MOV_LEGACY = struct.pack(">I", 8) + b"wide" + struct.pack(">I", 16) + b"mdat"
+
+
+@pytest.mark.parametrize("head, expected", [
+    (JPEG, "jpeg"),
+    (PNG, "png"),
+    (WAV, "wav"),
+    (AVI, "avi"),
+    (MP3_ID3, "mp3"),
+    (MP3_FRAME_SYNC, "mp3"),
+    (MP4, "isobmff"),
+    (MOV_FTYP, "isobmff"),
+    (MOV_LEGACY, "quicktime"),
+    (b"", None),
+    (b"fake image content", None),
+])
+def test_sniff_format(head, expected):
+    assert sniff_format(head) == expected
+
+
+@pytest.mark.parametrize("content_type, head", [
+    ("image/jpeg", JPEG),
+    ("image/jpg", JPEG),
+    ("image/png", PNG),
+    ("audio/wav", WAV),
+    ("audio/mpeg", MP3_ID3),
+    ("audio/mp3", MP3_FRAME_SYNC),
+    ("video/mp4", MP4),
+    ("video/avi", AVI),
+    ("video/quicktime", MOV_FTYP),
+    ("video/quicktime", MOV_LEGACY),
+])
+def test_matching_content_types(content_type, head):
+    assert matches_content_type(content_type, head)
+
+
+@pytest.mark.parametrize("content_type, head", [
+    ("image/jpeg", PNG),
+    ("image/png", JPEG),
+    ("audio/wav", AVI),
+    ("video/mp4", MOV_LEGACY),
+    ("image/jpeg", b""),
+    ("image/gif", JPEG),
+])
+def test_mismatched_content_types(content_type, head):
+    assert not matches_content_type(content_type, head)
+
+
+@pytest.fixture
+def server_app(tmp_path, monkeypatch):
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", "deepfake_test")
+    monkeypatch.setenv("RATE_LIMITS_ENABLED", "false")
+    sys.path.insert(0, str(Path(__file__).parent))
+    import server
+    from rate_limit import MemoryQuotaStore, RateLimiter
+
+    client = mongomock_motor.AsyncMongoMockClient()
+    monkeypatch.setattr(server, "db", client["deepfake_test"])
+    monkeypatch.setattr(server, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(server, "rate_limiter", RateLimiter(MemoryQuotaStore(), enabled=False))
+    return server
+
+
+@pytest.mark.parametrize("name, content, content_type", [
+    ("empty.jpg", b"", "image/jpeg"),
+    ("disguised.jpg", PNG, "image/jpeg"),
+])
+def test_upload_rejects_content_not_matching_type(server_app, tmp_path, name, content, content_type):
+    import httpx
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=server_app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="https://testserver") as client:
+            await client.post("/api/auth/register",
+                              json={"email": "sniff@example.com", "password": "x", "name": "Sniff"})
+            return await client.post("/api/upload", files={"file": (name, content, content_type)})
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File content does not match its type"
+    assert os.listdir(tmp_path) == []
@@ -0,0 +1,282 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+import rate_limit
+from rate_limit import (
+    BucketLimit,
+    MemoryQuotaStore,
+    RateLimiter,
+    RoleLimits,
+    TokenBucketLimiter,
+    load_role_limits,
+    too_many_requests,
+)
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limit.time, "monotonic", fake)
+    return fake
+
+
+class CountingStore(MemoryQuotaStore):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def add(self, user_id, day, nbytes, count):
+        self.calls += 1
+        return await super().add(user_id, day, nbytes, count)
+
+
+def make_request(peer, forwarded_for=None):
+    headers = []
+    if forwarded_for:
+        headers.append((b"x-forwarded-for", forwarded_for.encode()))
+    return Request({"type": "http", "headers": headers, "client": (peer, 1234)})
+
+
+def make_limiter(store=None, **kwargs):
+    role_limits = {
+        "user": RoleLimits(
+            upload=BucketLimit(capacity=2, refill_per_second=1),
+            daily_upload_bytes=100,
+            daily_upload_count=3,
+        )
+    }
+    return RateLimiter(store or MemoryQuotaStore(), role_limits=role_limits, enabled=True, **kwargs)
+
+
+USER = SimpleNamespace(user_id="user_1", role="user")
+
+
+def test_bucket_allows_capacity_then_reports_refill_time(clock):
+    buckets = TokenBucketLimiter()
+    limit = BucketLimit(capacity=2, refill_per_second=1)
+
+    assert buckets.acquire("k", limit) == 0
+    assert buckets.acquire("k", limit) == 0
+    assert buckets.acquire("k", limit) == pytest.approx(1.0)
+
+    clock.now += 0.5
+    assert buckets.acquire("k", limit) == pytest.approx(0.5)
+
+    clock.now += 0.5
+    assert buckets.acquire("k", limit) == 0
+
+
+def test_bucket_refill_is_capped_at_capacity(clock):
+    buckets = TokenBucketLimiter()
+    limit = BucketLimit(capacity=2, refill_per_second=1)
+
+    buckets.acquire("k", limit)
+    clock.now += 3600
+    assert buckets.acquire("k", limit) == 0
+    assert buckets.acquire("k", limit) == 0
+    assert buckets.acquire("k", limit) > 0
+
+
+def test_buckets_are_independent_per_key(clock):
+    buckets = TokenBucketLimiter()
+    limit = BucketLimit(capacity=1, refill_per_second=1)
+
+    assert buckets.acquire("a", limit) == 0
+    assert buckets.acquire("a", limit) > 0
+    assert buckets.acquire("b", limit) == 0
+
+
+def test_bucket_map_is_bounded_and_evicts_least_recently_used(clock):
+    buckets = TokenBucketLimiter(max_keys=100)
+    allowed = BucketLimit(capacity=5, refill_per_second=1)
+    denied = BucketLimit(capacity=0, refill_per_second=1)
+
+    buckets.acquire("hot", allowed)
+    for i in range(500):
+        buckets.acquire(f"allowed-{i}", allowed)
+        buckets.acquire(f"denied-{i}", denied)
+        if i % 50 == 0:
+            buckets.acquire("hot", allowed)
+
+    assert len(buckets._buckets) == 100
+    assert "allowed-0" not in buckets._buckets
+    assert "hot" in buckets._buckets
+    assert "denied-499" in buckets._buckets
+
+
+def test_acquire_stays_cheap_over_the_key_cap(clock):
+    buckets = TokenBucketLimiter(max_keys=10_000)
+    limit = BucketLimit(capacity=1, refill_per_second=1)
+    for i in range(10_000):
+        buckets.acquire(f"fill-{i}", limit)
+
+    start = time.perf_counter()
+    for i in range(2_000):
+        buckets.acquire(f"new-{i}", limit)
+    elapsed = time.perf_counter() - start
+
+    assert len(buckets._buckets) == 10_000
+    # A scan of the whole map per call would take seconds here
+    assert elapsed < 0.25
+
+
+def test_retry_after_is_rounded_up_to_whole_seconds():
+    assert too_many_requests("x", 0.2).headers["Retry-After"] == "1"
+    assert too_many_requests("x", 2.1).headers["Retry-After"] == "3"
+
+
+def test_check_user_raises_429_with_retry_after(clock):
+    limiter = make_limiter()
+    limiter.check_user(USER, "upload")
+    limiter.check_user(USER, "upload")
+
+    with pytest.raises(HTTPException) as exc:
+        limiter.check_user(USER, "upload")
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+
+
+def test_check_ip_uses_forwarded_for_only_from_trusted_proxy(clock):
+    limiter = make_limiter(
+        ip_limits=rate_limit.IPLimits(
+            auth=BucketLimit(capacity=1, refill_per_second=1),
+            upload=BucketLimit(capacity=1, refill_per_second=1),
+        ),
+        trusted_proxies={"10.0.0.1"},
+    )
+
+    # Two clients behind the same proxy get separate buckets
+    limiter.check_ip(make_request("10.0.0.1", "1.1.1.1"), "auth")
+    limiter.check_ip(make_request("10.0.0.1", "2.2.2.2"), "auth")
+    with pytest.raises(HTTPException):
+        limiter.check_ip(make_request("10.0.0.1", "1.1.1.1"), "auth")
+
+    # An untrusted peer cannot pick its bucket through the header
+    limiter.check_ip(make_request("3.3.3.3", "4.4.4.4"), "auth")
+    with pytest.raises(HTTPException):
+        limiter.check_ip(make_request("3.3.3.3", "5.5.5.5"), "auth")
+
+
+def test_client_ip_skips_trusted_hops():
+    request = make_request("10.0.0.1", "1.1.1.1, 10.0.0.2")
+    assert rate_limit.client_ip(request, {"10.0.0.1", "10.0.0.2"}) == "1.1.1.1"
+
+
+def test_quota_rejection_rolls_back_reservation():
+    store = MemoryQuotaStore()
+    limiter = make_limiter(store)
+
+    async def scenario():
+        day = await limiter.consume_upload_quota(USER, 60)
+        with pytest.raises(HTTPException) as exc:
+            await limiter.consume_upload_quota(USER, 60)
+        assert exc.value.status_code == 429
+        assert int(exc.value.headers["Retry-After"]) >= 1
+        # A smaller file still fits once the rejected one was given back
+        await limiter.consume_upload_quota(USER, 30)
+        return await store.add(USER.user_id, day, 0, 0)
+
+    assert asyncio.run(scenario()) == (90, 2)
+
+
+def test_exhausted_count_is_cached_in_memory():
+    store = CountingStore()
+    limiter = make_limiter(store)
+
+    async def scenario():
+        for _ in range(3):
+            await limiter.consume_upload_quota(USER, 1)
+        with pytest.raises(HTTPException):
+            await limiter.consume_upload_quota(USER, 1)
+        calls = store.calls
+        with pytest.raises(HTTPException):
+            await limiter.consume_upload_quota(USER, 1)
+        return calls
+
+    calls = asyncio.run(scenario())
+    assert store.calls == calls
+    assert USER.user_id in limiter._exhausted
+
+
+def test_refund_returns_bytes_and_count():
+    store = MemoryQuotaStore()
+    limiter = make_limiter(store)
+
+    async def scenario():
+        day = await limiter.consume_upload_quota(USER, 40)
+        await limiter.refund_upload_quota(USER, day, 40)
+        return await store.add(USER.user_id, day, 0, 0)
+
+    assert asyncio.run(scenario()) == (0, 0)
+
+
+def test_refund_clears_exhausted_cache():
+    store = MemoryQuotaStore()
+    limiter = make_limiter(store)
+
+    async def scenario():
+        for _ in range(2):
+            await limiter.consume_upload_quota(USER, 1)
+        # Two concurrent uploads at count - 1: the first takes the last slot...
+        first_day = await limiter.consume_upload_quota(USER, 1)
+        # ...the second is rejected and marks the user exhausted
+        with pytest.raises(HTTPException):
+            await limiter.consume_upload_quota(USER, 1)
+        assert USER.user_id in limiter._exhausted
+        # The first upload's write fails and its slot is refunded
+        await limiter.refund_upload_quota(USER, first_day, 1)
+        return await limiter.consume_upload_quota(USER, 1)
+
+    assert asyncio.run(scenario()) is not None
+    assert USER.user_id not in limiter._exhausted
+
+
+def test_disabled_limiter_charges_nothing():
+    store = CountingStore()
+    limiter = RateLimiter(store, enabled=False)
+
+    async def scenario():
+        day = await limiter.consume_upload_quota(USER, 10)
+        await limiter.refund_upload_quota(USER, day, 10)
+        return day
+
+    assert asyncio.run(scenario()) is None
+    assert store.calls == 0
+
+
+def test_partial_nested_override(monkeypatch):
+    monkeypatch.setenv("RATE_LIMITS", '{"user": {"upload": {"capacity": 5}}, "premium": {"daily_upload_count": 9}}')
+    limits = load_role_limits()
+
+    assert limits["user"].upload.capacity == 5
+    assert limits["user"].upload.refill_per_second == rate_limit.DEFAULT_ROLE_LIMITS["user"].upload.refill_per_second
+    assert limits["premium"].daily_upload_count == 9
+    assert limits["premium"].upload == rate_limit.DEFAULT_ROLE_LIMITS["user"].upload
+
+
+def test_mongo_quota_store_sets_expiry():
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    collection = mongomock_motor.AsyncMongoMockClient()["test"]["upload_quotas"]
+    store = rate_limit.MongoQuotaStore(collection)
+
+    async def scenario():
+        await store.ensure_indexes()
+        await store.add("user_1", "2026-10-18", 10, 1)
+        assert await store.add("user_1", "2026-10-18", 5, 1) == (15, 2)
+        return await collection.find_one({"_id": "user_1:2026-10-18"})
+
+    doc = asyncio.run(scenario())
+    assert doc["expires_at"].isoformat().startswith("2026-10-20T00:00:00")
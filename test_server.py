@@ -0,0 +1,65 @@
+import asyncio
+import sys
+import time
+import types
+from pathlib import Path
+
+import pytest
+
+
+@pytest.fixture
+def server(monkeypatch):
+    pytest.importorskip("mongomock_motor")
+    monkeypatch.setenv("MONGO_URL", "mongodb://localhost:27017")
+    monkeypatch.setenv("DB_NAME", "deepfake_test")
+    sys.path.insert(0, str(Path(__file__).parent))
+    import server
+    return server
+
+
+def test_concurrent_image_uploads_share_one_threaded_cv2_import(server, monkeypatch):
+    imports = []
+
+    def slow_import(name):
+        # Mirror real imports: the module is visible in sys.modules before it is ready
+        monkeypatch.setitem(sys.modules, name, types.ModuleType(name))
+        imports.append(name)
+        time.sleep(0.3)
+        return sys.modules[name]
+
+    monkeypatch.delitem(sys.modules, "cv2", raising=False)
+    monkeypatch.setattr(server, "_cv2_import", None)
+    monkeypatch.setattr(server.importlib, "import_module", slow_import)
+
+    async def scenario():
+        stalls = []
+
+        async def ticker():
+            last = time.perf_counter()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.perf_counter()
+                stalls.append(now - last)
+                last = now
+
+        ticking = asyncio.create_task(ticker())
+        first = asyncio.create_task(server.load_analysis_imports("image/jpeg"))
+        await asyncio.sleep(0.05)
+        second_started = time.perf_counter()
+        await server.load_analysis_imports("image/png")
+        second_waited = time.perf_counter() - second_started
+        await first
+        ticking.cancel()
+        return max(stalls), second_waited
+
+    worst_stall, second_waited = asyncio.run(scenario())
+    assert imports == ["cv2"]
+    # The second request waited for the import instead of racing past it
+    assert second_waited > 0.15
+    assert worst_stall < 0.1
+
+
+def test_non_image_uploads_skip_cv2(server, monkeypatch):
+    monkeypatch.setattr(server, "_cv2_import", None)
+    asyncio.run(server.load_analysis_imports("audio/wav"))
+    assert server._cv2_import is None